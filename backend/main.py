@@ -1,20 +1,84 @@
 import os
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, Request
+import hashlib
+import time
+import zlib
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from functools import lru_cache
+from aiobreaker import CircuitBreaker, CircuitBreakerError, CircuitBreakerState
+from async_lru import alru_cache
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.coder import Coder
+from fastapi_cache.decorator import cache
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
-import random
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
+from typing import Dict, List, Literal, NamedTuple, Optional, Tuple
 import httpx
+import ijson
+import msgspec
+import numpy as np
 
 from dotenv import load_dotenv
 load_dotenv()
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Setup logging (set LOG_LEVEL=DEBUG to dump raw upstream responses)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# One generator for the mock data; each call draws a whole batch at once
+_RNG = np.random.default_rng()
+RISK_LEVELS = ("low", "medium", "high")
+
+def risk_level_for(key: str) -> str:
+    # Derived from the event id rather than drawn at random, so cached
+    # responses are stable (crc32 rather than hash() so it's the same per worker)
+    return RISK_LEVELS[zlib.crc32(key.encode()) % len(RISK_LEVELS)]
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Short TTL: dashboards poll frequently, upstream data changes slowly
+UPSTREAM_CACHE_TTL = 45
+# Last good response kept much longer, served only when the upstream is failing
+STALE_CACHE_TTL = 3600
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis = aioredis.from_url(REDIS_URL)
+    FastAPICache.init(RedisBackend(redis), prefix="cum")
+    app.state.redis = redis
+    # One pooled client for all upstream calls so keep-alive connections are reused
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+    )
+    yield
+    await app.state.http.aclose()
+    await redis.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Per-client rate limits, shared across workers through Redis. Varying the
+# request body bypasses the caches, so blockchain-events is capped tightly to
+# bound the explorer fan-out a single client can cause.
+EVENTS_RATE_LIMIT = "10/second"
+MOCK_RATE_LIMIT = "100/second"
+limiter = Limiter(key_func=get_remote_address, storage_uri=REDIS_URL, in_memory_fallback_enabled=True)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+# Compress larger JSON bodies (event lists repeat addresses and explorer URLs)
+app.add_middleware(GZipMiddleware, minimum_size=500)
 
 # CORS for frontend access
 app.add_middleware(
@@ -23,6 +87,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "X-Partial-Failures"],
 )
 
 # --- Models ---
@@ -31,7 +96,9 @@ class BlockchainEventsRequest(BaseModel):
     protocol_addresses: List[str]
     upgrade_types: List[Literal["governance", "implementation", "parameter"]]
 
-class UpgradeEvent(BaseModel):
+# Built for every event on the hot path, so a msgspec Struct rather than a
+# pydantic model; it is only ever produced by us, never parsed from requests
+class UpgradeEvent(msgspec.Struct):
     id: str
     type: str
     protocol: str
@@ -40,6 +107,23 @@ class UpgradeEvent(BaseModel):
     risk_level: Literal["low", "medium", "high"]
     explorer_link: str
 
+_UPGRADE_EVENTS_DECODER = msgspec.json.Decoder(List[UpgradeEvent])
+
+class UpgradeEventsCoder(Coder):
+    # fastapi-cache's default JsonCoder goes through pydantic, which can't
+    # rebuild msgspec Structs; round-trip the event lists with msgspec instead
+    @classmethod
+    def encode(cls, value) -> bytes:
+        return msgspec.json.encode(value)
+
+    @classmethod
+    def decode(cls, value: bytes):
+        return _UPGRADE_EVENTS_DECODER.decode(value)
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_=None):
+        return cls.decode(value)
+
 class VolatilityPredictionRequest(BaseModel):
     token_pair: str
     time_horizon: Literal["1h", "24h", "7d"]
@@ -87,209 +171,540 @@ ETHERSCAN_API_KEY = os.getenv("ETHERSCAN_API_KEY", "")
 POLYGONSCAN_API_KEY = os.getenv("POLYGONSCAN_API_KEY", "")
 ARBISCAN_API_KEY = os.getenv("ARBISCAN_API_KEY", "")
 
-EXPLORER_URLS = {
-    "ethereum": "https://etherscan.io/address/",
-    "polygon": "https://polygonscan.com/address/",
-    "arbitrum": "https://arbiscan.io/address/",
-}
+class NetworkConfig(NamedTuple):
+    scan_api_url: str
+    scan_api_key: str
+    explorer_url: str
 
-SCAN_API_URLS = {
-    "ethereum": "https://api.etherscan.io/api",
-    "polygon": "https://api.polygonscan.com/api",
-    "arbitrum": "https://api.arbiscan.io/api",
+# Everything per network in one lookup
+NETWORKS = {
+    "ethereum": NetworkConfig(
+        scan_api_url="https://api.etherscan.io/api",
+        scan_api_key=ETHERSCAN_API_KEY,
+        explorer_url="https://etherscan.io/address/",
+    ),
+    "polygon": NetworkConfig(
+        scan_api_url="https://api.polygonscan.com/api",
+        scan_api_key=POLYGONSCAN_API_KEY,
+        explorer_url="https://polygonscan.com/address/",
+    ),
+    "arbitrum": NetworkConfig(
+        scan_api_url="https://api.arbiscan.io/api",
+        scan_api_key=ARBISCAN_API_KEY,
+        explorer_url="https://arbiscan.io/address/",
+    ),
 }
 
-SCAN_API_KEYS = {
-    "ethereum": ETHERSCAN_API_KEY,
-    "polygon": POLYGONSCAN_API_KEY,
-    "arbitrum": ARBISCAN_API_KEY,
-}
+@lru_cache(maxsize=1024)
+def explorer_link(network: str, address: str) -> str:
+    return NETWORKS[network].explorer_url + address
+
+class RateLimiter:
+    # At most `rate` calls started in any one-second window: each slot is held
+    # until its call finishes and at least a second has passed since it started
+    def __init__(self, rate: int):
+        self._slots = asyncio.Semaphore(rate)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._slots.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            remaining = 1 - (time.monotonic() - started)
+            if remaining > 0:
+                asyncio.get_running_loop().call_later(remaining, self._slots.release)
+            else:
+                self._slots.release()
+
+# Etherscan-family free tier allows 5 req/s per key
+SCAN_RATE_LIMITERS = {network: RateLimiter(5) for network in NETWORKS}
 
 UNISWAP_GOVERNANCE_CONTRACT = "0x5e4be8Bc9637f0EAA1A755019e06A68ce081D58F"
+# Lowercased once at import; addresses are compared case-insensitively
+_UNI_GOV = UNISWAP_GOVERNANCE_CONTRACT.lower()
 SNAPSHOT_GRAPHQL_URL = "https://hub.snapshot.org/graphql"
+# Static query text (only the page size varies, via variables) so request
+# bodies are byte-identical and Snapshot can reuse its parsed query
+SNAPSHOT_PROPOSALS_QUERY = """
+query Proposals($first: Int!) {
+  proposals(
+    first: $first,
+    skip: 0,
+    where: { space_in: ["uniswap"] },
+    orderBy: "created",
+    orderDirection: desc
+  ) {
+    id
+    title
+    body
+    start
+    end
+    created
+    state
+    author
+    link
+  }
+}
+"""
+SNAPSHOT_HEADERS = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
 
-async def fetch_uniswap_snapshot_proposals(limit: int = 5):
-    query = f"""
-    {{
-      proposals(
-        first: {limit},
-        skip: 0,
-        where: {{ space_in: [\"uniswap\"] }},
-        orderBy: \"created\",
-        orderDirection: desc
-      ) {{
-        id
-        title
-        body
-        start
-        end
-        created
-        state
-        author
-        link
-      }}
-    }}
-    """
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            resp = await client.post(
-                SNAPSHOT_GRAPHQL_URL,
-                json={"query": query}
-            )
-            data = resp.json()
-            print("Snapshot API response:", data)
-            if resp.status_code != 200 or "data" not in data or "proposals" not in data["data"]:
-                logger.error(f"Snapshot API error: {data}")
-                raise HTTPException(status_code=502, detail="Error fetching Uniswap proposals from Snapshot.")
-            return data["data"]["proposals"]
-        except httpx.HTTPError as e:
-            logger.error(f"HTTP error fetching Snapshot proposals: {e}")
+# Statuses that mean the upstream itself is unhealthy. Anything else (bad or
+# missing API key) is our misconfiguration and must not trip the breaker.
+UPSTREAM_FAILURE_STATUSES = (429, 502)
+
+def is_not_upstream_failure(exc: Exception) -> bool:
+    return isinstance(exc, HTTPException) and exc.status_code not in UPSTREAM_FAILURE_STATUSES
+
+def make_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        fail_max=5,
+        timeout_duration=timedelta(seconds=30),
+        exclude=[is_not_upstream_failure],
+        name=name,
+    )
+
+SCAN_BREAKERS = {network: make_breaker(network) for network in NETWORKS}
+SNAPSHOT_BREAKER = make_breaker("snapshot")
+
+async def call_upstream(breaker: CircuitBreaker, func, *args):
+    # Fail fast while the breaker is open instead of waiting on upstream timeouts
+    try:
+        return await breaker.call_async(func, *args)
+    except CircuitBreakerError:
+        logger.warning(f"Circuit open for {breaker.name}, failing fast")
+        raise HTTPException(status_code=503, detail="Upstream degraded")
+
+def upstream_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    # Only plain hashable args reach the cached helpers; hash them so keys stay short.
+    # fastapi-cache already prefixes the namespace with the global "cum" prefix.
+    raw = f"{func.__module__}:{func.__name__}:{args!r}:{sorted((kwargs or {}).items())!r}"
+    return f"{namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+# Proposals change a few times a day: keep an in-process copy in front of Redis.
+# alru_cache also folds concurrent calls for the same limit into one.
+@alru_cache(maxsize=8, ttl=60)
+@cache(expire=UPSTREAM_CACHE_TTL, namespace="snapshot", key_builder=upstream_key_builder)
+async def fetch_uniswap_snapshot_proposals(limit: int = 5) -> List[dict]:
+    return await call_upstream(SNAPSHOT_BREAKER, query_snapshot_proposals, limit)
+
+async def query_snapshot_proposals(limit: int) -> List[dict]:
+    client: httpx.AsyncClient = app.state.http
+    try:
+        resp = await client.post(
+            SNAPSHOT_GRAPHQL_URL,
+            json={"query": SNAPSHOT_PROPOSALS_QUERY, "variables": {"first": limit}},
+            headers=SNAPSHOT_HEADERS
+        )
+        data = resp.json()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Snapshot API response: %s", data)
+        if resp.status_code != 200 or "data" not in data or "proposals" not in data["data"]:
+            logger.error(f"Snapshot API error: {data}")
             raise HTTPException(status_code=502, detail="Error fetching Uniswap proposals from Snapshot.")
+        return data["data"]["proposals"]
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP error fetching Snapshot proposals: {e}")
+        raise HTTPException(status_code=502, detail="Error fetching Uniswap proposals from Snapshot.")
 
-async def fetch_contract_events(network: str, address: str, upgrade_types: List[str]):
-    # Special case: Uniswap governance proposals via Snapshot
-    if (
-        network == "ethereum"
-        and address.lower() == UNISWAP_GOVERNANCE_CONTRACT.lower()
-        and "governance" in upgrade_types
-    ):
-        try:
-            proposals = await fetch_uniswap_snapshot_proposals(limit=5)
-            events = []
-            for p in proposals:
-                events.append(UpgradeEvent(
-                    id=p["id"],
-                    type="governance",
-                    protocol=address,
-                    description=p.get("title") or p.get("body", "")[:100],
-                    timestamp=int(p.get("created", 0)),
-                    risk_level=random.choice(["low", "medium", "high"]),
-                    explorer_link=p.get("link", "")
-                ))
-            return events
-        except Exception as e:
-            logger.error(f"Error fetching Uniswap governance proposals from Snapshot: {e}")
-            raise HTTPException(status_code=502, detail="Error fetching Uniswap governance proposals.")
-    api_url = SCAN_API_URLS[network]
-    api_key = SCAN_API_KEYS[network]
-    explorer_url = EXPLORER_URLS[network]
-    events = []
-    if not api_key:
-        raise HTTPException(status_code=500, detail=f"Missing {network} API key.")
-    async with httpx.AsyncClient(timeout=10) as client:
-        # Fetch contract internal transactions (proxy for upgrades/parameter changes)
+# Only the most recent internal txs are turned into events
+MAX_TXS_PER_ADDRESS = 10
+# Mock governance events are dated somewhere in the last 30 days
+MOCK_GOVERNANCE_WINDOW = 30 * 24 * 3600
+
+class AsyncByteReader:
+    # Minimal async file-like wrapper so ijson can consume an httpx byte stream
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0) to detect bytes vs str; don't consume a chunk
+        if size == 0:
+            return b""
         try:
-            resp = await client.get(api_url, params={
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+async def read_scan_result(resp: httpx.Response, limit: int) -> Tuple[Optional[str], Optional[str], List[dict]]:
+    # Stream-parse {"status", "message", "result"} and stop once `limit` txs are
+    # read, instead of parsing an address's whole history. Returns the status,
+    # the result text (set when result is an error string) and the txs.
+    status = None
+    result_text = None
+    txs = []
+    builder = None
+    async for prefix, event, value in ijson.parse_async(AsyncByteReader(resp.aiter_bytes())):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "result.item" and event == "end_map":
+                txs.append(builder.value)
+                builder = None
+        elif prefix == "result.item" and event == "start_map":
+            if len(txs) >= limit:
+                if status is not None:
+                    break
+                continue
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == "status":
+            status = value
+        elif prefix == "result" and event == "string":
+            result_text = value
+    return status, result_text, txs
+
+async def fetch_internal_txs(network: str, address: str) -> Optional[List[dict]]:
+    # Fetch contract internal transactions (proxy for upgrades/parameter changes)
+    conf = NETWORKS[network]
+    client: httpx.AsyncClient = app.state.http
+    try:
+        async with SCAN_RATE_LIMITERS[network].slot():
+            async with client.stream("GET", conf.scan_api_url, params={
                 "module": "account",
                 "action": "txlistinternal",
                 "address": address,
                 "sort": "desc",
-                "apikey": api_key
-            })
-            data = resp.json()
-            print("Etherscan API response:", data)
-            if data.get("status") != "1":
-                if "Invalid API Key" in data.get("result", ""):
-                    raise HTTPException(status_code=401, detail=f"Invalid {network} API key.")
-                if "rate limit" in data.get("result", "").lower():
-                    raise HTTPException(status_code=429, detail=f"{network.capitalize()} API rate limit exceeded.")
-                logger.warning(f"No internal tx for {address} on {network}: {data.get('result')}")
-                return []
-            for tx in data["result"][:10]:
-                # Heuristic: if input data is not empty, could be upgrade/parameter change
-                if int(tx.get("isError", "0")) == 0 and tx.get("input") and tx.get("input") != "0x":
-                    event_type = "upgrade" if "implementation" in upgrade_types else "parameter"
-                    events.append(UpgradeEvent(
-                        id=tx["hash"],
-                        type=event_type,
-                        protocol=address,
-                        description=f"Internal tx: {tx['hash'][:10]}...",
-                        timestamp=int(tx["timeStamp"]),
-                        risk_level=random.choice(["low", "medium", "high"]),
-                        explorer_link=explorer_url + address
-                    ))
-        except httpx.HTTPError as e:
-            logger.error(f"HTTP error fetching {network} events: {e}")
-            raise HTTPException(status_code=502, detail=f"Error fetching {network} events.")
+                "apikey": conf.scan_api_key
+            }) as resp:
+                status, result_text, txs = await read_scan_result(resp, MAX_TXS_PER_ADDRESS)
+    except httpx.HTTPError as e:
+        logger.error(f"HTTP error fetching {network} events: {e}")
+        raise HTTPException(status_code=502, detail=f"Error fetching {network} events.")
+    except ijson.JSONError as e:
+        # Outages tend to come back as HTML error pages or cut-off bodies
+        logger.error(f"Invalid JSON from {network} scan API: {e}")
+        raise HTTPException(status_code=502, detail=f"Error fetching {network} events.")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s scan API response: status=%s result=%s", network, status, result_text or txs)
+    if status != "1":
+        if "Invalid API Key" in (result_text or ""):
+            raise HTTPException(status_code=401, detail=f"Invalid {network} API key.")
+        if "rate limit" in (result_text or "").lower():
+            raise HTTPException(status_code=429, detail=f"{network.capitalize()} API rate limit exceeded.")
+        logger.warning(f"No internal tx for {address} on {network}: {result_text}")
+        return None
+    return txs
+
+async def build_uniswap_governance_events(address: str) -> List[UpgradeEvent]:
+    # Uniswap governance proposals via Snapshot
+    try:
+        proposals = await fetch_uniswap_snapshot_proposals(limit=5)
+        events = []
+        for p in proposals:
+            events.append(UpgradeEvent(
+                id=p["id"],
+                type="governance",
+                protocol=address,
+                description=p.get("title") or (p.get("body") or "")[:100],
+                timestamp=int(p.get("created") or 0),
+                risk_level=risk_level_for(p["id"]),
+                explorer_link=p.get("link") or ""
+            ))
+        return events
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching Uniswap governance proposals from Snapshot: {e}")
+        raise HTTPException(status_code=502, detail="Error fetching Uniswap governance proposals.")
+
+# Contracts served from a dedicated source instead of the explorer, keyed by
+# (network, lowercased address) -> (upgrade type it serves, event builder)
+SPECIAL_EVENT_SOURCES = {
+    ("ethereum", _UNI_GOV): ("governance", build_uniswap_governance_events),
+}
+
+def find_special_source(network: str, address: str, upgrade_types):
+    source = SPECIAL_EVENT_SOURCES.get((network, address.lower()))
+    if source is not None and source[0] in upgrade_types:
+        return source[1]
+    return None
+
+FetchKey = Tuple[str, str, Tuple[str, ...]]
+
+# Upstream fetches currently in flight, so concurrent requests for the same
+# address share one explorer call instead of each missing the cache
+_INFLIGHT_FETCHES: Dict[FetchKey, asyncio.Task] = {}
+
+# Upstream errors for which a stale copy is better than failing the request
+STALE_FALLBACK_STATUSES = (429, 502, 503)
+
+# Keys with a background revalidation scheduled or running, and when it was
+# scheduled; requests for them get the stale copy straight away instead of also
+# waiting on the upstream. Entries older than REVALIDATION_WINDOW are ignored
+# in case the background task never ran.
+_REVALIDATING: Dict[FetchKey, float] = {}
+REVALIDATION_WINDOW = 30
+
+def is_revalidating(key: FetchKey) -> bool:
+    since = _REVALIDATING.get(key)
+    return since is not None and time.monotonic() - since < REVALIDATION_WINDOW
+
+async def fetch_contract_events(
+    network: str, address: str, upgrade_types: List[str], background_tasks: BackgroundTasks
+) -> Tuple[List[UpgradeEvent], bool]:
+    # Returns the events and whether they are a stale copy
+    # Fail fast on a missing key before touching the cache or the network
+    if find_special_source(network, address, upgrade_types) is None and not NETWORKS[network].scan_api_key:
+        raise HTTPException(status_code=500, detail=f"Missing {network} API key.")
+    # Normalise args so equivalent requests share one in-flight fetch, cache
+    # entry and stale copy; addresses are case-insensitive on chain
+    key = (network, address.lower(), tuple(sorted(upgrade_types)))
+    events, is_stale = await fetch_contract_events_for_key(key, background_tasks)
+    return respell_events(events, network, address), is_stale
+
+async def fetch_contract_events_for_key(
+    key: FetchKey, background_tasks: BackgroundTasks
+) -> Tuple[List[UpgradeEvent], bool]:
+    network, address, _ = key
+    if is_revalidating(key):
+        stale = await load_stale_events(key)
+        if stale is not None:
+            return stale, True
+    try:
+        return await fetch_contract_events_shared(key), False
+    except HTTPException as e:
+        if e.status_code not in STALE_FALLBACK_STATUSES:
+            raise
+        stale = await load_stale_events(key)
+        if stale is None:
+            raise
+        logger.warning(f"Serving stale events for {address} on {network}: {e.detail}")
+        if should_revalidate(key, e):
+            _REVALIDATING[key] = time.monotonic()
+            background_tasks.add_task(revalidate_contract_events, key)
+        return stale, True
+
+def respell_events(events: List[UpgradeEvent], network: str, address: str) -> List[UpgradeEvent]:
+    # Shared events are built for the lowercased address; hand them back with
+    # the caller's spelling in protocol and the explorer link
+    lowered = address.lower()
+    if address == lowered:
+        return events
+    lowered_link = explorer_link(network, lowered)
+    link = explorer_link(network, address)
+    return [
+        msgspec.structs.replace(
+            e, protocol=address, explorer_link=link if e.explorer_link == lowered_link else e.explorer_link
+        )
+        for e in events
+    ]
+
+def upstream_breaker(key: FetchKey) -> CircuitBreaker:
+    network, address, upgrade_types = key
+    if find_special_source(network, address, upgrade_types) is not None:
+        return SNAPSHOT_BREAKER
+    return SCAN_BREAKERS[network]
+
+def should_revalidate(key: FetchKey, error: HTTPException) -> bool:
+    # Retrying straight after a rate limit, or while the breaker is open, only
+    # adds load to an upstream that is already refusing us
+    if is_revalidating(key) or error.status_code == 429:
+        return False
+    return upstream_breaker(key).current_state != CircuitBreakerState.OPEN
+
+async def fetch_contract_events_shared(key: FetchKey) -> List[UpgradeEvent]:
+    task = _INFLIGHT_FETCHES.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_contract_events_cached(*key))
+        _INFLIGHT_FETCHES[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT_FETCHES.pop(key, None))
+    # Shield so one cancelled caller doesn't cancel the fetch for the others
+    return await asyncio.shield(task)
+
+async def revalidate_contract_events(key: FetchKey):
+    # Runs after the response is sent, so nothing may escape from here
+    try:
+        await fetch_contract_events_shared(key)
+    except HTTPException as e:
+        logger.warning(f"Revalidation failed for {key[1]} on {key[0]}: {e.detail}")
+    except Exception as e:
+        logger.warning(f"Revalidation failed for {key[1]} on {key[0]}: {e}")
+    finally:
+        _REVALIDATING.pop(key, None)
+
+def stale_key(key: FetchKey) -> str:
+    network, address, upgrade_types = key
+    return f"cum:stale:{network}:{address}:{','.join(upgrade_types)}"
+
+async def store_stale_events(key: FetchKey, events: List[UpgradeEvent]):
+    try:
+        await app.state.redis.set(
+            stale_key(key), msgspec.json.encode(events), ex=STALE_CACHE_TTL
+        )
+    except RedisError as e:
+        logger.warning(f"Could not store stale copy for {key[1]} on {key[0]}: {e}")
+
+async def load_stale_events(key: FetchKey) -> Optional[List[UpgradeEvent]]:
+    try:
+        raw = await app.state.redis.get(stale_key(key))
+    except RedisError as e:
+        logger.warning(f"Could not read stale copy for {key[1]} on {key[0]}: {e}")
+        return None
+    if raw is None:
+        return None
+    return _UPGRADE_EVENTS_DECODER.decode(raw)
+
+def unique_addresses(addresses: List[str]) -> List[str]:
+    # Explorer addresses are case-insensitive; keep the first spelling seen
+    seen = set()
+    unique = []
+    for addr in addresses:
+        if addr.lower() not in seen:
+            seen.add(addr.lower())
+            unique.append(addr)
+    return unique
+
+@cache(expire=UPSTREAM_CACHE_TTL, namespace="events", key_builder=upstream_key_builder, coder=UpgradeEventsCoder)
+async def _fetch_contract_events_cached(network: str, address: str, upgrade_types: Tuple[str, ...]) -> List[UpgradeEvent]:
+    events = await build_contract_events(network, address, upgrade_types)
+    # Structs aren't type-checked when constructed; check once here so nothing
+    # is cached that the strict decoder would then reject on every hit
+    try:
+        events = _UPGRADE_EVENTS_DECODER.decode(msgspec.json.encode(events))
+    except msgspec.ValidationError as e:
+        logger.error(f"Malformed events for {address} on {network}: {e}")
+        raise HTTPException(status_code=502, detail=f"Malformed upstream data for {address}.")
+    await store_stale_events((network, address, upgrade_types), events)
+    return events
+
+async def build_contract_events(network: str, address: str, upgrade_types: Tuple[str, ...]) -> List[UpgradeEvent]:
+    special_source = find_special_source(network, address, upgrade_types)
+    if special_source is not None:
+        return await special_source(address)
+    link = explorer_link(network, address)
+    events = []
+    txs = await call_upstream(SCAN_BREAKERS[network], fetch_internal_txs, network, address)
+    if txs is None:
+        return []
+    for tx in txs:
+        # Heuristic: if input data is not empty, could be upgrade/parameter change
+        if int(tx.get("isError", "0")) == 0 and tx.get("input") and tx.get("input") != "0x":
+            event_type = "upgrade" if "implementation" in upgrade_types else "parameter"
+            events.append(UpgradeEvent(
+                id=tx["hash"],
+                type=event_type,
+                protocol=address,
+                description=f"Internal tx: {tx['hash'][:10]}...",
+                timestamp=int(tx["timeStamp"]),
+                risk_level=risk_level_for(tx["hash"]),
+                explorer_link=link
+            ))
     # Governance proposals: not directly available, but for some protocols, can be fetched from logs (not implemented here)
     # For demo, add a mock governance event if requested
     if "governance" in upgrade_types:
+        # Stable within a minute so the response stays cacheable; the timestamp
+        # is a fixed per-address offset into the last 30 days
+        now = int(time.time())
         events.append(UpgradeEvent(
-            id=f"gov-{address[:6]}-{random.randint(1000,9999)}",
+            id=f"gov-{address[:6]}-{now // 60:x}",
             type="governance",
             protocol=address,
             description="Mock governance proposal (real fetch requires protocol-specific subgraph)",
-            timestamp=int(random.uniform(1680000000, 1700000000)),
-            risk_level=random.choice(["low", "medium", "high"]),
-            explorer_link=explorer_url + address
+            timestamp=now - zlib.crc32(address.encode()) % MOCK_GOVERNANCE_WINDOW,
+            risk_level=risk_level_for(address),
+            explorer_link=link
         ))
     return events
 
 # --- Endpoints ---
-@app.post("/api/blockchain-events", response_model=List[UpgradeEvent])
-async def blockchain_events(req: BlockchainEventsRequest):
+# Events are encoded with msgspec, so the response schema comes from msgspec too
+_, _EVENT_SCHEMAS = msgspec.json.schema_components([UpgradeEvent])
+
+@app.post("/api/blockchain-events", responses={200: {
+    "description": "Upgrade events",
+    "content": {"application/json": {"schema": {"type": "array", "items": _EVENT_SCHEMAS["UpgradeEvent"]}}},
+}})
+@limiter.limit(EVENTS_RATE_LIMIT)
+async def blockchain_events(request: Request, req: BlockchainEventsRequest, background_tasks: BackgroundTasks):
     logger.info(f"Received blockchain-events request: {req}")
+    addresses = unique_addresses(req.protocol_addresses)
+    results = await asyncio.gather(
+        *[fetch_contract_events(req.network, addr, req.upgrade_types, background_tasks) for addr in addresses],
+        return_exceptions=True
+    )
+    # Best effort: one failing address shouldn't discard the others' events
     all_events = []
-    for addr in req.protocol_addresses:
-        try:
-            events = await fetch_contract_events(req.network, addr, req.upgrade_types)
-            all_events.extend(events)
-        except HTTPException as e:
-            logger.error(f"Error for {addr} on {req.network}: {e.detail}")
-            raise e
-        except Exception as e:
-            logger.error(f"Unhandled error for {addr} on {req.network}: {e}")
-            raise HTTPException(status_code=500, detail=f"Error fetching events for {addr} on {req.network}")
-    return all_events
-
-@app.post("/api/volatility-prediction", response_model=VolatilityPredictionResponse)
-async def volatility_prediction(req: VolatilityPredictionRequest):
+    failed = []
+    first_error = None
+    served_stale = False
+    for addr, result in zip(addresses, results):
+        if isinstance(result, Exception):
+            if isinstance(result, HTTPException):
+                logger.error(f"Error for {addr} on {req.network}: {result.detail}")
+                first_error = first_error or result
+            else:
+                logger.error(f"Unhandled error for {addr} on {req.network}: {result}")
+            failed.append(addr)
+            continue
+        events, is_stale = result
+        all_events.extend(events)
+        served_stale = served_stale or is_stale
+    if failed and len(failed) == len(addresses):
+        raise first_error or HTTPException(status_code=500, detail=f"Error fetching events on {req.network}")
+    headers = {}
+    if failed:
+        headers["X-Partial-Failures"] = ",".join(failed)
+    if served_stale:
+        headers["X-Cache"] = "stale"
+    return Response(content=msgspec.json.encode(all_events), media_type="application/json", headers=headers)
+
+# The mock endpoints below build their output themselves, so they return
+# ORJSONResponse directly and skip response-model validation and
+# jsonable_encoder; `responses=` keeps the schemas in the OpenAPI docs.
+@app.post("/api/volatility-prediction", responses={200: {"model": VolatilityPredictionResponse}})
+@limiter.limit(MOCK_RATE_LIMIT)
+async def volatility_prediction(request: Request, req: VolatilityPredictionRequest):
     logger.info(f"Received volatility-prediction request: {req}")
     # Mock GARCH/EGARCH
-    model = random.choice(["GARCH(1,1)", "EGARCH"])
-    volatility = round(random.uniform(0.01, 0.2), 4)
-    confidence = round(random.uniform(0.7, 0.99), 2)
-    return VolatilityPredictionResponse(
-        model=model,
-        volatility=volatility,
-        confidence=confidence,
-        time_horizon=req.time_horizon
-    )
+    model = ("GARCH(1,1)", "EGARCH")[int(_RNG.integers(2))]
+    volatility, confidence = _RNG.uniform([0.01, 0.7], [0.2, 0.99]).tolist()
+    volatility = round(volatility, 4)
+    confidence = round(confidence, 2)
+    return ORJSONResponse({
+        "model": model,
+        "volatility": volatility,
+        "confidence": confidence,
+        "time_horizon": req.time_horizon
+    })
 
-@app.post("/api/liquidity-prediction", response_model=LiquidityPredictionResponse)
-async def liquidity_prediction(req: LiquidityPredictionRequest):
+@app.post("/api/liquidity-prediction", responses={200: {"model": LiquidityPredictionResponse}})
+@limiter.limit(MOCK_RATE_LIMIT)
+async def liquidity_prediction(request: Request, req: LiquidityPredictionRequest):
     logger.info(f"Received liquidity-prediction request: {req}")
     # Mock ARIMA/Prophet
-    model = random.choice(["ARIMA", "Prophet"])
-    liquidity_shift = round(random.uniform(-0.2, 0.2), 4)
-    confidence = round(random.uniform(0.7, 0.99), 2)
-    return LiquidityPredictionResponse(
-        model=model,
-        liquidity_shift=liquidity_shift,
-        confidence=confidence,
-        time_horizon=req.time_horizon
-    )
+    model = ("ARIMA", "Prophet")[int(_RNG.integers(2))]
+    liquidity_shift, confidence = _RNG.uniform([-0.2, 0.7], [0.2, 0.99]).tolist()
+    liquidity_shift = round(liquidity_shift, 4)
+    confidence = round(confidence, 2)
+    return ORJSONResponse({
+        "model": model,
+        "liquidity_shift": liquidity_shift,
+        "confidence": confidence,
+        "time_horizon": req.time_horizon
+    })
 
-@app.post("/api/sentiment-analysis", response_model=SentimentAnalysisResponse)
-async def sentiment_analysis(req: SentimentAnalysisRequest):
+@app.post("/api/sentiment-analysis", responses={200: {"model": SentimentAnalysisResponse}})
+@limiter.limit(MOCK_RATE_LIMIT)
+async def sentiment_analysis(request: Request, req: SentimentAnalysisRequest):
     logger.info(f"Received sentiment-analysis request: {req}")
     # Placeholder for Twitter API + BERT model
     # In production, fetch tweets and run BERT sentiment
-    positive = round(random.uniform(0.2, 0.7), 2)
-    neutral = round(random.uniform(0.1, 0.5), 2)
+    positive, neutral = (round(x, 2) for x in _RNG.uniform([0.2, 0.1], [0.7, 0.5]).tolist())
     negative = round(1 - positive - neutral, 2)
     overall = round(positive - negative, 2)
-    tweet_count = random.randint(20, 100)
-    return SentimentAnalysisResponse(
-        positive=positive,
-        neutral=neutral,
-        negative=negative,
-        overall=overall,
-        tweet_count=tweet_count
-    )
+    tweet_count = int(_RNG.integers(20, 101))
+    return ORJSONResponse({
+        "positive": positive,
+        "neutral": neutral,
+        "negative": negative,
+        "overall": overall,
+        "tweet_count": tweet_count
+    })
 
-@app.post("/api/risk-score", response_model=RiskScoreResponse)
-async def risk_score(req: RiskScoreRequest):
+@app.post("/api/risk-score", responses={200: {"model": RiskScoreResponse}})
+@limiter.limit(MOCK_RATE_LIMIT)
+async def risk_score(request: Request, req: RiskScoreRequest):
     logger.info(f"Received risk-score request: {req}")
     # Simple multi-factor risk scoring
     score = int(
@@ -298,17 +713,17 @@ async def risk_score(req: RiskScoreRequest):
         0.4 * (1 - req.governance_score) * 100
     )
     score = max(0, min(100, score))
-    return RiskScoreResponse(
-        risk_score=score,
-        factors={
+    return ORJSONResponse({
+        "risk_score": score,
+        "factors": {
             "market_volatility": req.market_volatility,
             "liquidity": req.liquidity,
             "governance_score": req.governance_score
         }
-    )
+    })
 
 # --- Error Handling ---
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled error: {exc}")
-    return HTTPException(status_code=500, detail="Internal server error") 
\ No newline at end of file
+    logger.error(f"Unhandled error on {request.url.path}: {exc}", exc_info=exc)
+    return ORJSONResponse(status_code=500, content={"detail": "Internal server error"}) 
\ No newline at end of file
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import httpx
+import ijson
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+class FakeStreamResponse:
+    # Stands in for a streamed httpx.Response; records how much was read
+    def __init__(self, body: bytes, chunk_size: int = 16):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.chunks_read = 0
+
+    async def aiter_bytes(self):
+        for i in range(0, len(self.body), self.chunk_size):
+            self.chunks_read += 1
+            yield self.body[i:i + self.chunk_size]
+
+
+def make_tx(i: int) -> dict:
+    return {"hash": f"0x{i:064x}", "isError": "0", "input": "0x12", "timeStamp": "1700000000"}
+
+
+def test_read_scan_result_stops_after_limit():
+    body = json.dumps({"status": "1", "message": "OK", "result": [make_tx(i) for i in range(50)]}).encode()
+    resp = FakeStreamResponse(body)
+
+    status, result_text, txs = asyncio.run(main.read_scan_result(resp, 10))
+
+    assert status == "1"
+    assert result_text is None
+    assert txs == [make_tx(i) for i in range(10)]
+    # Parsing stopped early instead of reading the whole history
+    assert resp.chunks_read < len(body) // resp.chunk_size
+
+
+def test_read_scan_result_error_string():
+    body = json.dumps({"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}).encode()
+
+    status, result_text, txs = asyncio.run(main.read_scan_result(FakeStreamResponse(body), 10))
+
+    assert status == "0"
+    assert result_text == "Max rate limit reached"
+    assert txs == []
+
+
+def test_read_scan_result_truncated_body():
+    body = json.dumps({"status": "1", "message": "OK", "result": [make_tx(i) for i in range(3)]}).encode()
+
+    with pytest.raises(ijson.JSONError):
+        asyncio.run(main.read_scan_result(FakeStreamResponse(body[:-40]), 10))
+
+
+def test_fetch_internal_txs_non_json_body_is_bad_gateway(monkeypatch):
+    transport = httpx.MockTransport(lambda request: httpx.Response(502, text="<html>Bad gateway</html>"))
+
+    async def run():
+        monkeypatch.setattr(main.app.state, "http", httpx.AsyncClient(transport=transport), raising=False)
+        return await main.fetch_internal_txs("ethereum", "0xabc")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(run())
+    assert exc_info.value.status_code == 502
+
+
+def test_uniswap_events_tolerate_null_snapshot_fields(monkeypatch):
+    async def fake_proposals(limit=5):
+        return [{"id": "0xabc", "title": None, "body": None, "created": None, "link": None}]
+
+    monkeypatch.setattr(main, "fetch_uniswap_snapshot_proposals", fake_proposals)
+
+    events = asyncio.run(main.build_uniswap_governance_events(main.UNISWAP_GOVERNANCE_CONTRACT))
+
+    assert events[0].description == ""
+    assert events[0].explorer_link == ""
+    assert events[0].timestamp == 0
+    # Survives the strict decoder used on cache hits and stale reads
+    assert main._UPGRADE_EVENTS_DECODER.decode(main.msgspec.json.encode(events)) == events
+
+
+def test_address_spellings_share_one_fetch(monkeypatch):
+    calls = []
+
+    async def fake_fetch(network, address, upgrade_types):
+        calls.append(address)
+        await asyncio.sleep(0)
+        return [main.UpgradeEvent(
+            id="0x1", type="parameter", protocol=address, description="tx",
+            timestamp=1, risk_level="low", explorer_link=main.explorer_link(network, address),
+        )]
+
+    monkeypatch.setattr(main, "_fetch_contract_events_cached", fake_fetch)
+    monkeypatch.setitem(main.NETWORKS, "ethereum", main.NETWORKS["ethereum"]._replace(scan_api_key="key"))
+    mixed, lower = "0xAbC0000000000000000000000000000000000001", "0xabc0000000000000000000000000000000000001"
+
+    async def run():
+        return await asyncio.gather(
+            main.fetch_contract_events("ethereum", mixed, ["implementation"], main.BackgroundTasks()),
+            main.fetch_contract_events("ethereum", lower, ["implementation"], main.BackgroundTasks()),
+        )
+
+    (mixed_events, _), (lower_events, _) = asyncio.run(run())
+
+    assert calls == [lower]
+    assert mixed_events[0].protocol == mixed
+    assert mixed_events[0].explorer_link == main.explorer_link("ethereum", mixed)
+    assert lower_events[0].protocol == lower